@@ -1,8 +1,10 @@
 import math
+import re
+import sys
 from datetime import date
 
 import streamlit as st
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 
 # --------------------------- 基础配置 ---------------------------
 
@@ -20,59 +22,77 @@ st.caption(
 )
 
 # 从 Streamlit Secrets 里读取 Supabase 配置（患者端只用 anon key）
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_ANON_KEY = st.secrets["SUPABASE_ANON_KEY"]
+@st.cache_resource
+def get_supabase_client() -> Client:
+    url = st.secrets["SUPABASE_URL"]
+    key = st.secrets["SUPABASE_ANON_KEY"]
+    # 单次 PostgREST 请求最多等待 10 秒（默认 120 秒），避免卡住的请求长期占用连接
+    return create_client(url, key, options=ClientOptions(postgrest_client_timeout=10))
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+
+supabase = get_supabase_client()
 
 # ------------------------ 简单菜品热量字典 ------------------------
 
-DISH_KCAL = {
-    "泡菜牛肉定食": 750,
-    "牛肉饭": 650,
-    "咖喱牛肉饭": 800,
-    "盖浇饭": 700,
-    "炒饭": 650,
-    "麻辣香锅": 900,
-    "沙拉": 150,
-    "鸡胸肉": 200,
-    "煎鸡胸肉": 250,
-    "鸡蛋": 80,
-    "鸡蛋饼": 150,
-    "米饭": 150,   # 一小碗
-    "面条": 400,
-    "包子": 120,   # 一个
-    "馒头": 110,
-    "汉堡": 500,
-    "薯条": 350,
-    "牛奶": 120,   # 一杯
-    "酸奶": 100,
-    # 可以根据日常饮食慢慢往这里补充
-}
+# Streamlit 每次交互都会重跑脚本，字典和正则用 cache_resource 每个进程只构建一次
+
+
+@st.cache_resource
+def dish_table() -> dict[str, int]:
+    """菜名 -> 热量（kcal），菜名做 intern。"""
+    table = {
+        "泡菜牛肉定食": 750,
+        "牛肉饭": 650,
+        "咖喱牛肉饭": 800,
+        "盖浇饭": 700,
+        "炒饭": 650,
+        "麻辣香锅": 900,
+        "沙拉": 150,
+        "鸡胸肉": 200,
+        "煎鸡胸肉": 250,
+        "鸡蛋": 80,
+        "鸡蛋饼": 150,
+        "米饭": 150,   # 一小碗
+        "面条": 400,
+        "包子": 120,   # 一个
+        "馒头": 110,
+        "汉堡": 500,
+        "薯条": 350,
+        "牛奶": 120,   # 一杯
+        "酸奶": 100,
+        # 可以根据日常饮食慢慢往这里补充
+    }
+    return {sys.intern(k): v for k, v in table.items()}
+
+
+@st.cache_resource
+def dish_pattern() -> re.Pattern:
+    """菜名正则。"""
+    # 按菜名长度倒序拼成一个正则，一次扫描即可匹配所有菜名；
+    # 长菜名优先，避免“煎鸡胸肉”再被重复算成“鸡胸肉”
+    return re.compile("|".join(map(re.escape, sorted(dish_table(), key=len, reverse=True))))
+
+
+DISH_KCAL = dish_table()
+_DISH_RE = dish_pattern()
 
 
 def estimate_meal_kcal(meal_text: str) -> int:
     """
     根据文本粗略估算一餐热量：
-    - 只要包含字典中的菜名，就累加对应热量；
+    - 文本中每出现一次字典中的菜名，就累加对应热量（长菜名优先匹配）；
     - 一个都没匹配到时返回 0，由患者手动填写。
     """
     text = meal_text.strip()
     if not text:
         return 0
 
-    total = 0
-    for name, kcal in DISH_KCAL.items():
-        if name in text:
-            total += kcal
-
-    return total
+    return sum(DISH_KCAL[m.group(0)] for m in _DISH_RE.finditer(text))
 
 
 # 为了在点击按钮后保留估算结果，用 session_state 记录
-for key in ["breakfast_kcal", "lunch_kcal", "dinner_kcal"]:
-    if key not in st.session_state:
-        st.session_state[key] = 0
+for key in ("breakfast_kcal", "lunch_kcal", "dinner_kcal"):
+    st.session_state.setdefault(key, 0)
 
 # ------------------------ 基本信息：日期 & 记录代码 ------------------------
 
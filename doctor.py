@@ -1,10 +1,31 @@
-import random
 from datetime import datetime, date, timedelta
 
 import pandas as pd
-import altair as alt
 import streamlit as st
-from supabase import create_client, Client
+from postgrest import APIError
+
+from doctor_common import (
+    NUMERIC_COLS,
+    PATIENT_COLS,
+    PATIENT_PAGE_SIZE,
+    PATIENT_SEARCH_LIMIT,
+    PATIENT_SEARCH_MIN_CHARS,
+    PLOT_COLS,
+    RECORD_COLS,
+    RECORD_PAGE_SIZE,
+    SEARCH_STRIP,
+    WEEKLY_SUMMARY_MIN_DAYS,
+    df_to_csv_bytes,
+    downcast_numeric,
+    downsample_for_plot,
+    generate_patient_code,
+    get_fetch_pool,
+    get_supabase_client,
+    patient_labels,
+    patients_to_df,
+    records_csv_to_df,
+    trend_chart_spec,
+)
 
 
 # ---------------------- 基础配置 ---------------------- #
@@ -21,62 +42,137 @@ st.caption(
     "⚠ 本页面仅供医生使用，请不要分享给患者。"
 )
 
-
-@st.cache_resource
-def get_supabase_client() -> Client:
-    url = st.secrets["SUPABASE_URL"]
-    key = st.secrets["SUPABASE_SERVICE_KEY"]
-    return create_client(url, key)
-
-
 supabase = get_supabase_client()
 
 
 # ---------------------- 工具函数 ---------------------- #
 
-
-def generate_patient_code() -> str:
-    """生成形如 PYYMMDDXXX 的患者代码。"""
-    today = datetime.utcnow().strftime("%y%m%d")
-    suffix = random.randint(100, 999)
-    return f"P{today}{suffix}"
-
-
-def load_patients(limit: int = 200) -> pd.DataFrame:
-    """读取最近创建的患者代码列表。"""
-    try:
-        res = (
-            supabase.table("patients")
-            .select("*")
-            .order("created_at", desc=True)
-            .limit(limit)
-            .execute()
+@st.cache_data(ttl=30, show_spinner=False)
+def load_patients(limit: int = 200, after: tuple[str, str] | None = None) -> pd.DataFrame:
+    """
+    读取最近创建的患者代码列表（最近在最上面）。
+    after 为上一页最后一条的 (created_at, id)，传入时读取排在它之后的下一页；
+    带上 id 是为了 created_at 相同的多条记录不会在翻页时被跳过。
+    读取失败时直接抛出（st.cache_data 不缓存异常），由调用方提示，避免把空列表缓存下来。
+    """
+    query = (
+        supabase.table("patients")
+        .select(PATIENT_COLS)
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(limit)
+    )
+    if after:
+        created_at, row_id = after
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt.{row_id})'
         )
-        data = res.data or []
-    except Exception as e:
-        st.error(f"读取患者列表失败：{e}")
-        data = []
-
-    df = pd.DataFrame(data)
-    # 统一列名，避免 KeyError
-    if "patient_code" not in df.columns:
-        df["patient_code"] = None
-    if "remark" not in df.columns:
-        df["remark"] = None
-    if "created_at" in df.columns:
-        df["created_at"] = pd.to_datetime(df["created_at"])
-    return df
-
-
-def insert_patient(patient_code: str, remark: str | None = None) -> bool:
-    """插入一条新的患者记录。"""
-    payload = {"patient_code": patient_code, "remark": remark or None}
+    res = query.execute()
+    return patients_to_df(res.data or [])
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def search_patients(term: str) -> pd.DataFrame:
+    """
+    按患者代码或备注模糊搜索（服务端 ilike，patients 上有 pg_trgm 索引）。
+    搜索失败时直接抛出（st.cache_data 不缓存异常），由调用方提示。
+    """
+    pattern = f"*{term.translate(SEARCH_STRIP)}*"
+    res = (
+        supabase.table("patients")
+        .select(PATIENT_COLS)
+        .or_(f"patient_code.ilike.{pattern},remark.ilike.{pattern}")
+        .order("created_at", desc=True)
+        .limit(PATIENT_SEARCH_LIMIT)
+        .execute()
+    )
+    return patients_to_df(res.data or [])
+
+
+def next_patients_cursor(df_page: pd.DataFrame) -> tuple[str, str] | None:
+    """一页读满时返回最后一条的 (created_at, id) 作为下一页游标，否则返回 None。"""
+    if len(df_page) < PATIENT_PAGE_SIZE or not {"created_at", "id"} <= set(df_page.columns):
+        return None
+    last = df_page.iloc[-1]
+    return last["created_at"].isoformat(), str(last["id"])
+
+
+def set_patients_page(df_page: pd.DataFrame) -> None:
+    """用第一页数据重置会话内的患者列表与分页游标。"""
+    st.session_state["patients_df"] = df_page
+    st.session_state["patients_cursor"] = next_patients_cursor(df_page)
+    st.session_state["patients_df_dirty"] = False
+    st.session_state.pop("patients_csv", None)
+
+
+def patients_df_cached() -> pd.DataFrame:
+    """同一会话内复用患者列表；增删改后置脏标记，下次调用时重新读取。"""
+    if "patients_df" not in st.session_state or st.session_state.get("patients_df_dirty"):
+        try:
+            df_page = load_patients(limit=PATIENT_PAGE_SIZE)
+        except Exception as e:
+            # 读取失败时不写入会话，下次重跑会重新读取；已有列表时先继续显示旧列表
+            st.error(f"读取患者列表失败：{e}")
+            return st.session_state.get("patients_df", patients_to_df([]))
+        set_patients_page(df_page)
+    return st.session_state["patients_df"]
+
+
+def patients_csv_cached(df: pd.DataFrame) -> bytes:
+    """会话内患者列表 df 对应的 CSV，列表变化（重新读取 / 加载更多）时才重新生成。"""
+    if "patients_csv" not in st.session_state:
+        st.session_state["patients_csv"] = df_to_csv_bytes(df)
+    return st.session_state["patients_csv"]
+
+
+def load_more_patients() -> None:
+    """按游标读取下一页患者并追加到会话内的列表。"""
+    cursor = st.session_state.get("patients_cursor")
+    if not cursor:
+        return
     try:
-        supabase.table("patients").insert(payload).execute()
-        return True
+        df_more = load_patients(limit=PATIENT_PAGE_SIZE, after=cursor)
     except Exception as e:
-        st.error(f"保存患者代码失败：{e}")
-        return False
+        st.error(f"读取患者列表失败：{e}")
+        return
+    st.session_state["patients_df"] = pd.concat(
+        [st.session_state["patients_df"], df_more], ignore_index=True
+    )
+    st.session_state["patients_cursor"] = next_patients_cursor(df_more)
+    st.session_state.pop("patients_csv", None)
+
+
+def create_patient(remark: str | None = None, max_try: int = 5) -> str | None:
+    """
+    生成并保存一个新的患者代码，成功时返回该代码。
+    - 唯一性由 patients.patient_code 的唯一索引保证，重复（23505）时重新生成；
+    - 同一次 RPC 会返回最新的患者列表，用来刷新会话缓存。
+    """
+    for _ in range(max_try):
+        params = {
+            "p_patient_code": generate_patient_code(),
+            "p_remark": remark or None,
+            "p_limit": PATIENT_PAGE_SIZE,
+        }
+        try:
+            res = supabase.rpc("insert_and_list_patients", params).execute()
+            data = res.data or {}
+        except APIError as e:
+            if e.code == "23505":
+                continue
+            st.error(f"保存患者代码失败：{e}")
+            return None
+        except Exception as e:
+            st.error(f"保存患者代码失败：{e}")
+            return None
+
+        load_patients.clear()
+        search_patients.clear()
+        set_patients_page(patients_to_df(data.get("list") or []))
+        return params["p_patient_code"]
+
+    return None
 
 
 def update_patient_remark(patient_code: str, new_remark: str | None) -> bool:
@@ -88,6 +184,9 @@ def update_patient_remark(patient_code: str, new_remark: str | None) -> bool:
             .eq("patient_code", patient_code)
             .execute()
         )
+        load_patients.clear()
+        search_patients.clear()
+        st.session_state["patients_df_dirty"] = True
         return True
     except Exception as e:
         st.error(f"更新备注失败：{e}")
@@ -103,60 +202,123 @@ def delete_patient(patient_code: str) -> bool:
             .eq("patient_code", patient_code)
             .execute()
         )
+        load_patients.clear()
+        search_patients.clear()
+        st.session_state["patients_df_dirty"] = True
         return True
     except Exception as e:
         st.error(f"删除患者代码失败：{e}")
         return False
 
 
+def fetch_records_window(
+    patient_codes: tuple[str, ...], start_date: date, end_date: date
+) -> str:
+    """
+    读取若干患者在一个日期窗口内的记录（窗口大小保证不超过 RECORD_PAGE_SIZE 行）。
+    以 text/csv 返回，交给 records_csv_to_df 用 read_csv 解析。
+    """
+    res = (
+        supabase.table("daily_records")
+        .select(RECORD_COLS)
+        .in_("patient_code", list(patient_codes))
+        .gte("log_date", start_date.isoformat())
+        .lte("log_date", end_date.isoformat())
+        .order("log_date", desc=False)
+        .order("patient_code", desc=False)
+        .limit(RECORD_PAGE_SIZE)
+        .csv()
+        .execute()
+    )
+    # 没有记录时客户端返回 []
+    return res.data if isinstance(res.data, str) else ""
+
+
+@st.cache_data(ttl=30, show_spinner=False)
 def load_patient_records(
-    patient_code: str, start_date: date, end_date: date
+    patient_codes: tuple[str, ...], start_date: date, end_date: date
 ) -> pd.DataFrame:
-    """从 daily_records 读取某个患者在日期范围内的记录。"""
-    try:
-        res = (
-            supabase.table("daily_records")
-            .select("*")
-            .eq("patient_code", patient_code)
-            .gte("log_date", start_date.isoformat())
-            .lte("log_date", end_date.isoformat())
-            .order("log_date", desc=False)
-            .execute()
-        )
-        data = res.data or []
-    except Exception as e:
-        st.error(f"读取患者记录失败：{e}")
-        data = []
+    """
+    从 daily_records 读取一个或多个患者在日期范围内的记录。
+    日期范围切成若干窗口（每个窗口最多 RECORD_PAGE_SIZE 行），各窗口并发请求后按顺序拼接。
+    读取失败时直接抛出（st.cache_data 不缓存异常），由调用方提示，避免把空结果缓存下来。
+    """
+    window_days = max(1, RECORD_PAGE_SIZE // len(patient_codes))
+    windows = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=window_days - 1), end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+
+    pages = get_fetch_pool().map(
+        lambda w: fetch_records_window(patient_codes, w[0], w[1]), windows
+    )
+    return records_csv_to_df(list(pages))
 
-    df = pd.DataFrame(data)
 
+@st.cache_data(ttl=30, show_spinner=False)
+def load_weekly_summary(
+    patient_codes: tuple[str, ...], start_date: date, end_date: date
+) -> pd.DataFrame:
+    """
+    通过 RPC 读取若干患者在日期范围内的每周平均指标（log_date 为该周周一）。
+    读取失败时直接抛出（st.cache_data 不缓存异常），由调用方处理。
+    """
+    params = {
+        "p_codes": list(patient_codes),
+        "p_start": start_date.isoformat(),
+        "p_end": end_date.isoformat(),
+    }
+    res = supabase.rpc("patient_weekly_summary", params).execute()
+    df = pd.DataFrame(res.data or [])
     if df.empty:
         return df
 
-    # 处理日期列
-    if "log_date" in df.columns:
-        df["log_date"] = pd.to_datetime(df["log_date"])
-
-    # 尝试统一一些常见字段名
-    if "BMI" in df.columns and "bmi" not in df.columns:
-        df["bmi"] = df["BMI"]
-    if "total_calories" in df.columns and "total_kcal" not in df.columns:
-        df["total_kcal"] = df["total_calories"]
-    if "pressure_score" in df.columns and "stress_level" not in df.columns:
-        df["stress_level"] = df["pressure_score"]
+    df = df[[c for c in PLOT_COLS if c in df.columns]]
+    df["log_date"] = pd.to_datetime(df["log_date"])
+    numeric_cols = [c for c in NUMERIC_COLS if c in df.columns]
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
+    return downcast_numeric(df)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_plot_frame(
+    patient_codes: tuple[str, ...], start_date: date, end_date: date
+) -> tuple[pd.DataFrame, bool]:
+    """
+    趋势图使用的数据及是否为每周汇总，按 (patient_codes, start, end) 缓存，
+    与图表无关的控件变化引起的重跑不再重复切片 / 降采样。
+    """
+    if (end_date - start_date).days > WEEKLY_SUMMARY_MIN_DAYS:
+        try:
+            df_weekly = load_weekly_summary(patient_codes, start_date, end_date)
+        except Exception as e:
+            # 每周汇总读取失败时退回按原始记录画图
+            st.warning(f"读取每周汇总失败，改用原始记录绘图：{e}")
+        else:
+            if not df_weekly.empty:
+                return df_weekly, True
 
-    return df
+    # 图表只需要日期和数值指标，不把三餐文本等列重复发给浏览器
+    df_records = load_patient_records(patient_codes, start_date, end_date)
+    plot_cols = [c for c in PLOT_COLS if c in df_records.columns]
+    return downsample_for_plot(df_records[plot_cols]), False
 
 
-# ---------------------- 页面结构 ---------------------- #
-
-tab_codes, tab_records = st.tabs(["🧾 患者代码管理", "📊 患者记录浏览"])
+@st.cache_data(ttl=30, show_spinner=False)
+def records_csv_bytes(
+    patient_codes: tuple[str, ...], start_date: date, end_date: date
+) -> bytes:
+    """所选患者在日期范围内记录的 CSV，与 load_patient_records 使用相同的缓存键。"""
+    return df_to_csv_bytes(load_patient_records(patient_codes, start_date, end_date))
 
 
 # ======================================================
-# Tab 1: 患者代码管理
+# 页面 1: 患者代码管理
 # ======================================================
-with tab_codes:
+def render_codes_tab() -> None:
+    """患者代码的新建、列表、导出与备注编辑。"""
     st.subheader("新建患者代码")
 
     remark_input = st.text_input(
@@ -165,23 +327,10 @@ with tab_codes:
     )
 
     if st.button("✨ 生成患者代码并保存", type="primary"):
-        # 循环生成，避免偶然重复（极小概率）
-        max_try = 5
-        success = False
-        last_code = None
-        for _ in range(max_try):
-            code = generate_patient_code()
-            last_code = code
-            # 简单检查是否已存在
-            df_exist = load_patients(limit=1000)
-            if not df_exist.empty and code in df_exist["patient_code"].tolist():
-                continue
-            if insert_patient(code, remark_input.strip() or None):
-                success = True
-                break
+        new_code = create_patient(remark_input.strip() or None)
 
-        if success:
-            st.success(f"已生成并保存患者代码：`{last_code}`")
+        if new_code:
+            st.success(f"已生成并保存患者代码：`{new_code}`")
             st.info("请将该代码发给对应受试者，在患者端填写使用。")
         else:
             st.error("多次尝试仍未成功生成代码，请稍后重试。")
@@ -189,7 +338,7 @@ with tab_codes:
     st.markdown("---")
     st.subheader("已创建患者代码（最近在最上面）")
 
-    patients_df = load_patients(limit=500)
+    patients_df = patients_df_cached()
     if patients_df.empty:
         st.warning("当前还没有患者代码。")
     else:
@@ -200,13 +349,17 @@ with tab_codes:
             hide_index=True,
         )
 
+        if st.session_state.get("patients_cursor"):
+            st.button("⏬ 加载更多患者代码", on_click=load_more_patients)
+
         # 下载 CSV
-        csv_bytes = patients_df.to_csv(index=False).encode("utf-8-sig")
+        csv_bytes = patients_csv_cached(patients_df)
         st.download_button(
             "⬇️ 下载患者列表（CSV）",
             data=csv_bytes,
             file_name=f"patients_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv",
             mime="text/csv",
+            on_click="ignore",  # 下载不触发整页重跑
         )
 
     st.markdown("---")
@@ -215,21 +368,33 @@ with tab_codes:
     if patients_df.empty:
         st.info("暂无患者代码，无法编辑备注。")
     else:
-        # 生成下拉标签：Pxxxxxx - 备注
-        patients_df["label"] = patients_df.apply(
-            lambda r: f"{r['patient_code']} - {r['remark']}" if r.get("remark") else r["patient_code"],
-            axis=1,
-        )
+        search = st.text_input(
+            f"搜索患者代码 / 备注（至少 {PATIENT_SEARCH_MIN_CHARS} 个字符；留空时从上面的列表中选择）",
+            key="patient_search",
+        ).strip()
+        if len(search) >= PATIENT_SEARCH_MIN_CHARS:
+            try:
+                patients_df = search_patients(search)
+            except Exception as e:
+                st.error(f"搜索患者失败：{e}")
+                return
+            if patients_df.empty:
+                st.info("没有匹配的患者代码。")
+                return
+
+        # 生成下拉标签：Pxxxxxx - 备注（不写回会话缓存中的 DataFrame）
+        labels = patient_labels(patients_df)
 
         selected_label = st.selectbox(
             "选择要编辑的患者代码",
-            patients_df["label"],
+            labels,
         )
 
-        # 反查 patient_code
-        selected_row = patients_df[patients_df["label"] == selected_label].iloc[0]
-        selected_patient_code = selected_row["patient_code"]
-        current_remark = selected_row.get("remark") or ""
+        # 反查 patient_code / 备注（标签 -> 值 的字典查找）
+        code_by_label = dict(zip(labels, patients_df["patient_code"]))
+        remark_by_label = dict(zip(labels, patients_df["remark"].fillna("")))
+        selected_patient_code = code_by_label[selected_label]
+        current_remark = remark_by_label[selected_label]
 
         new_remark = st.text_input(
             "备注内容（患者真实姓名等，可修改）",
@@ -254,27 +419,55 @@ with tab_codes:
 
 
 # ======================================================
-# Tab 2: 患者记录浏览
+# 页面 2: 患者记录浏览
 # ======================================================
-with tab_records:
+def render_records_tab() -> None:
+    """按患者与日期范围浏览记录、趋势图与导出。"""
     st.subheader("选择患者与时间范围")
 
-    patients_df2 = load_patients(limit=1000)
+    patients_df2 = patients_df_cached()
     if patients_df2.empty:
         st.warning("当前没有患者代码，请先在『患者代码管理』中创建。")
     else:
-        patients_df2["label"] = patients_df2.apply(
-            lambda r: f"{r['patient_code']} - {r['remark']}" if r.get("remark") else r["patient_code"],
-            axis=1,
-        )
+        # 列表只含最近的 PATIENT_PAGE_SIZE 个患者：更早的患者通过搜索或加载更多找到
+        search2 = st.text_input(
+            f"搜索患者代码 / 备注（至少 {PATIENT_SEARCH_MIN_CHARS} 个字符；留空时从最近创建的患者中选择）",
+            key="records_patient_search",
+        ).strip()
+        if len(search2) >= PATIENT_SEARCH_MIN_CHARS:
+            try:
+                candidates_df = search_patients(search2)
+            except Exception as e:
+                # 搜索失败时仍保留已选中的患者
+                st.error(f"搜索患者失败：{e}")
+                candidates_df = patients_to_df([])
+            else:
+                if candidates_df.empty:
+                    st.info("没有匹配的患者代码。")
+        else:
+            candidates_df = patients_df2
+            if st.session_state.get("patients_cursor"):
+                st.button(
+                    "⏬ 加载更多患者代码",
+                    on_click=load_more_patients,
+                    key="records_load_more_patients",
+                )
 
-        selected_label2 = st.selectbox(
-            "选择患者代码",
-            patients_df2["label"],
-            key="records_patient_select",
+        # 选项为患者代码，已选中的患者换了搜索词后仍保留在选项中
+        label_by_code = st.session_state.setdefault("records_label_by_code", {})
+        label_by_code.update(zip(candidates_df["patient_code"], patient_labels(candidates_df)))
+        selected_before = st.session_state.get("records_patient_multiselect", [])
+        options = list(dict.fromkeys([*selected_before, *candidates_df["patient_code"]]))
+
+        patient_codes = tuple(
+            st.multiselect(
+                "选择患者代码（可多选）",
+                options,
+                default=selected_before or options[:1],
+                format_func=lambda code: label_by_code.get(code, code),
+                key="records_patient_multiselect",
+            )
         )
-        selected_row2 = patients_df2[patients_df2["label"] == selected_label2].iloc[0]
-        patient_code_for_view = selected_row2["patient_code"]
 
         col_start, col_end = st.columns(2)
         default_end = date.today()
@@ -285,13 +478,20 @@ with tab_records:
         with col_end:
             end_date = st.date_input("结束日期", value=default_end)
 
-        if start_date > end_date:
+        if not patient_codes:
+            st.info("请至少选择一个患者代码。")
+        elif start_date > end_date:
             st.error("起始日期不能晚于结束日期。")
         else:
             st.markdown("---")
-            st.subheader(f"📄 患者 `{patient_code_for_view}` 的记录")
+            codes_text = "、".join(f"`{code}`" for code in patient_codes)
+            st.subheader(f"📄 患者 {codes_text} 的记录")
 
-            df_records = load_patient_records(patient_code_for_view, start_date, end_date)
+            try:
+                df_records = load_patient_records(patient_codes, start_date, end_date)
+            except Exception as e:
+                st.error(f"读取患者记录失败：{e}")
+                return
 
             if df_records.empty:
                 st.info("该时间段内没有记录。")
@@ -306,99 +506,45 @@ with tab_records:
                 if "log_date" not in df_records.columns:
                     st.warning("记录中缺少 log_date 字段，无法绘制趋势图。")
                 else:
-                    # 体重
-                    if "weight" in df_records.columns:
-                        chart_weight = (
-                            alt.Chart(df_records)
-                            .mark_line(point=True)
-                            .encode(
-                                x="log_date:T",
-                                y=alt.Y("weight:Q", title="体重 (kg)"),
-                            )
-                            .properties(title="体重变化")
-                        )
-                        st.altair_chart(chart_weight, use_container_width=True)
-
-                    # BMI
-                    if "bmi" in df_records.columns:
-                        chart_bmi = (
-                            alt.Chart(df_records)
-                            .mark_line(point=True, color="#E76F51")
-                            .encode(
-                                x="log_date:T",
-                                y=alt.Y("bmi:Q", title="BMI"),
-                            )
-                            .properties(title="BMI 变化")
-                        )
-                        st.altair_chart(chart_bmi, use_container_width=True)
-
-                    # 总卡路里
-                    if "total_kcal" in df_records.columns:
-                        chart_kcal = (
-                            alt.Chart(df_records)
-                            .mark_line(point=True, color="#2A9D8F")
-                            .encode(
-                                x="log_date:T",
-                                y=alt.Y("total_kcal:Q", title="每日总卡路里 (kcal)"),
-                            )
-                            .properties(title="每日总卡路里")
+                    df_plot, is_weekly = load_plot_frame(patient_codes, start_date, end_date)
+                    if is_weekly:
+                        st.caption(
+                            f"日期范围超过 {WEEKLY_SUMMARY_MIN_DAYS} 天，"
+                            "趋势图显示每周平均值（每晚更新）。"
+                            "每周按周一至周日计算，首尾两周可能包含所选范围之外的日期。"
                         )
-                        st.altair_chart(chart_kcal, use_container_width=True)
-
-                    # 睡眠 & 压力
-                    if "sleep_hours" in df_records.columns or "stress_level" in df_records.columns:
-                        base = alt.Chart(df_records).encode(x="log_date:T")
-
-                        layers = []
-                        if "sleep_hours" in df_records.columns:
-                            layers.append(
-                                base.mark_line(point=True, color="#264653").encode(
-                                    y=alt.Y("sleep_hours:Q", title="睡眠时长 (h)")
-                                )
-                            )
-                        if "stress_level" in df_records.columns:
-                            layers.append(
-                                base.mark_line(point=True, color="#E9C46A").encode(
-                                    y=alt.Y("stress_level:Q", title="压力 / 睡眠质量评分")
-                                )
-                            )
-                        if layers:
-                            chart_sleep_stress = alt.layer(*layers).resolve_scale(y="independent")
-                            chart_sleep_stress = chart_sleep_stress.properties(title="睡眠 & 压力 / 睡眠质量")
-                            st.altair_chart(chart_sleep_stress, use_container_width=True)
-
-                    # 运动
-                    if "sport_minutes" in df_records.columns:
-                        chart_sport = (
-                            alt.Chart(df_records)
-                            .mark_bar()
-                            .encode(
-                                x="log_date:T",
-                                y=alt.Y("sport_minutes:Q", title="运动时长 (min)"),
-                            )
-                            .properties(title="运动时长")
-                        )
-                        st.altair_chart(chart_sport, use_container_width=True)
-
-                    # 排便次数
-                    if "bowel_count" in df_records.columns:
-                        chart_bowel = (
-                            alt.Chart(df_records)
-                            .mark_bar(color="#F4A261")
-                            .encode(
-                                x="log_date:T",
-                                y=alt.Y("bowel_count:Q", title="排便次数"),
-                            )
-                            .properties(title="排便次数")
-                        )
-                        st.altair_chart(chart_bowel, use_container_width=True)
+
+                    spec = trend_chart_spec(
+                        tuple(df_plot.columns), by_patient=len(patient_codes) > 1
+                    )
+                    if spec:
+                        st.vega_lite_chart(df_plot, spec, use_container_width=True)
 
                 # 再给一个导出记录按钮
                 st.markdown("### ⬇️ 导出当前时间段记录")
-                records_csv = df_records.to_csv(index=False).encode("utf-8-sig")
+                records_csv = records_csv_bytes(patient_codes, start_date, end_date)
+                # 多个患者时文件名只写人数，避免随所选患者增多无限变长
+                codes_part = (
+                    patient_codes[0]
+                    if len(patient_codes) == 1
+                    else f"{len(patient_codes)}_patients"
+                )
                 st.download_button(
                     "下载记录（CSV）",
                     data=records_csv,
-                    file_name=f"records_{patient_code_for_view}_{start_date}_{end_date}.csv",
+                    file_name=f"records_{codes_part}_{start_date}_{end_date}.csv",
                     mime="text/csv",
+                    on_click="ignore",
                 )
+
+
+# ---------------------- 页面结构 ---------------------- #
+
+# 用侧边栏切换页面：每次重跑只渲染当前页面（st.tabs 会把所有标签页都执行一遍）
+PAGES = {
+    "🧾 患者代码管理": render_codes_tab,
+    "📊 患者记录浏览": render_records_tab,
+}
+
+page = st.sidebar.radio("页面", list(PAGES), key="page")
+PAGES[page]()
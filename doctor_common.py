@@ -0,0 +1,334 @@
+import io
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+from supabase import create_client, Client, ClientOptions
+
+# 医生端共用的客户端 / 常量 / 数据转换 / 图表 spec。
+# 被 doctor.py 导入：Streamlit 每次交互只重跑主脚本，这里的定义每个进程只执行一次。
+
+
+# ---------------------- 客户端 ---------------------- #
+
+
+@st.cache_resource
+def get_supabase_client() -> Client:
+    url = st.secrets["SUPABASE_URL"]
+    key = st.secrets["SUPABASE_SERVICE_KEY"]
+    # 单次 PostgREST 请求最多等待 10 秒（默认 120 秒），避免卡住的请求长期占用连接
+    return create_client(url, key, options=ClientOptions(postgrest_client_timeout=10))
+
+
+# ---------------------- 常量 ---------------------- #
+
+# 患者列表每页条数（按 (created_at, id) 倒序做 keyset 分页）
+PATIENT_PAGE_SIZE = 500
+
+# daily_records 每次请求的最大行数；每个患者每天最多一条记录，
+# 所以 n 个患者的 RECORD_PAGE_SIZE // n 天日期窗口用一次请求即可取完
+RECORD_PAGE_SIZE = 1000
+
+# 并发请求 Supabase 的线程数
+FETCH_WORKERS = 4
+
+# patients 表中页面用到的列
+PATIENT_COLS = "id,patient_code,remark,created_at"
+
+# daily_records 中实际展示 / 导出的列（与患者端 app.py 写入的字段一致）及读取时的 dtype。
+# log_date 单独按日期解析；整数列先按可空的 Int64 读入（缺失值为 <NA>，超出小整数范围
+# 也不会溢出），再由 downcast_numeric 收窄；取值很少的文本列直接读成 Categorical。
+RECORD_DTYPES = {
+    "patient_code": "category",
+    "breakfast": str,
+    "lunch": str,
+    "dinner": str,
+    "breakfast_kcal": "Int64",
+    "lunch_kcal": "Int64",
+    "dinner_kcal": "Int64",
+    "total_kcal": "Int64",
+    "bowel_count": "Int64",
+    "bowel_status": "category",
+    "sleep_hours": "float32",
+    "sleep_quality": "Int64",
+    "stress_level": "Int64",
+    "sport_minutes": "Int64",
+    "weight": "float32",
+    "BMI": "float32",
+    "medication": str,
+}
+RECORD_COLS = ",".join(["log_date", *RECORD_DTYPES])
+
+# daily_records 中的数值列（统一成数值 dtype，传给前端时 Arrow 编码更紧凑）
+NUMERIC_COLS = [
+    "breakfast_kcal",
+    "lunch_kcal",
+    "dinner_kcal",
+    "total_kcal",
+    "bowel_count",
+    "sleep_hours",
+    "sleep_quality",
+    "stress_level",
+    "sport_minutes",
+    "weight",
+    "BMI",
+]
+
+# 日期范围超过该天数时，趋势图改用数据库中按周汇总的数据（patient_weekly）
+WEEKLY_SUMMARY_MIN_DAYS = 60
+
+# 趋势图最多绘制的点数，超过时按天数分桶取均值
+MAX_PLOT_POINTS = 1000
+
+# 趋势图用到的列（patient_code 用于多患者时按患者区分颜色）
+PLOT_COLS = [
+    "log_date",
+    "patient_code",
+    "weight",
+    "BMI",
+    "total_kcal",
+    "sleep_hours",
+    "stress_level",
+    "sport_minutes",
+    "bowel_count",
+]
+
+# PostgREST 过滤语法中的保留字符，搜索词中直接去掉
+SEARCH_STRIP = str.maketrans("", "", ',()"\\*%')
+
+# 模糊搜索至少需要的字符数 / 最多返回条数
+PATIENT_SEARCH_MIN_CHARS = 2
+PATIENT_SEARCH_LIMIT = 200
+
+
+# ---------------------- 工具函数 ---------------------- #
+
+
+@st.cache_resource
+def get_fetch_pool() -> ThreadPoolExecutor:
+    """进程内共享的线程池，用于并发发出多个 Supabase 请求（线程在重跑之间保持复用）。"""
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="supabase-fetch")
+
+
+_SYS_RAND = secrets.SystemRandom()
+
+
+def generate_patient_code() -> str:
+    """生成形如 PYYMMDDXXX 的患者代码（XXX 为 000-999 的随机数）。"""
+    today = datetime.utcnow().strftime("%y%m%d")
+    return f"P{today}{_SYS_RAND.randrange(1000):03d}"
+
+
+def patients_to_df(data: list[dict]) -> pd.DataFrame:
+    """把 patients 表的行转换成 DataFrame，并补齐常用列。"""
+    df = pd.DataFrame(data)
+    # 统一列名，避免 KeyError
+    if "patient_code" not in df.columns:
+        df["patient_code"] = None
+    if "remark" not in df.columns:
+        df["remark"] = None
+    if "created_at" in df.columns:
+        df["created_at"] = pd.to_datetime(df["created_at"])
+    return df
+
+
+def patient_labels(df: pd.DataFrame) -> pd.Series:
+    """生成下拉框标签：有备注时为「Pxxxxxx - 备注」，否则为患者代码。"""
+    code = df["patient_code"].astype(str)
+    remark = df["remark"].fillna("").astype(str)
+    return code.where(remark.str.len() == 0, code + " - " + remark)
+
+
+def records_csv_to_df(pages: list[str]) -> pd.DataFrame:
+    """
+    把 PostgREST 以 text/csv 返回的若干页 daily_records 拼成一个 DataFrame。
+    各页表头相同，只保留一份，整体交给 read_csv 的 C 解析器按 RECORD_DTYPES 解析，
+    不经过 JSON 解码和逐行 dict；遇到与 dtype 不符的值时退回 pandas 推断 + 转换。
+    """
+    pages = [p for p in pages if p]
+    if not pages:
+        return pd.DataFrame()
+
+    header = pages[0].split("\n", 1)[0]
+    bodies = [p.split("\n", 1)[1] for p in pages if "\n" in p]
+    text = "\n".join([header, *(b for b in bodies if b)])
+
+    try:
+        df = read_records_csv(text, RECORD_DTYPES)
+    except (ValueError, TypeError):
+        # 例如整数列中出现小数：数值列不指定 dtype，读入后再统一转换成数值
+        text_dtypes = {c: t for c, t in RECORD_DTYPES.items() if c not in NUMERIC_COLS}
+        df = read_records_csv(text, text_dtypes)
+        numeric_cols = [c for c in NUMERIC_COLS if c in df.columns]
+        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
+
+    if df.empty:
+        return df
+
+    return downcast_numeric(df)
+
+
+def read_records_csv(text: str, dtypes: dict) -> pd.DataFrame:
+    """按给定 dtype 解析 daily_records 的 CSV 文本。"""
+    # 只把空字段当作缺失值，三餐 / 用药文本里的 "NA"、"null" 等按原样保留
+    return pd.read_csv(
+        io.StringIO(text),
+        dtype=dtypes,
+        parse_dates=["log_date"],
+        keep_default_na=False,
+        na_values=[""],
+    )
+
+
+def downcast_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    把数值列收窄为 float32 / 小整数类型（取值范围都很小），减少内存和传给前端的数据量。
+    可空整数列（Int16 等）收窄后仍是可空整数。
+    """
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            kind = "integer" if pd.api.types.is_integer_dtype(df[col]) else "float"
+            df[col] = pd.to_numeric(df[col], downcast=kind)
+    return df
+
+
+# ---------------------- 导出与图表 ---------------------- #
+
+
+def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """导出带 BOM 的 UTF-8 CSV（Excel 可直接打开），直接写入字节缓冲区。"""
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding="utf-8-sig")
+    return buf.getvalue()
+
+
+def downsample_for_plot(df_plot: pd.DataFrame) -> pd.DataFrame:
+    """
+    日期跨度很长时按 N 天分桶取均值（多个患者时各自分桶），使总点数不超过 MAX_PLOT_POINTS。
+    只用于画图，表格和 CSV 仍使用原始记录。
+    """
+    if len(df_plot) <= MAX_PLOT_POINTS:
+        return df_plot
+
+    n_patients = df_plot["patient_code"].nunique() if "patient_code" in df_plot.columns else 1
+    span_days = (df_plot["log_date"].max() - df_plot["log_date"].min()).days + 1
+    bucket_days = -(-span_days * n_patients // MAX_PLOT_POINTS)
+    if "patient_code" in df_plot.columns:
+        resampled = df_plot.groupby("patient_code", observed=True).resample(
+            f"{bucket_days}D", on="log_date"
+        )
+    else:
+        resampled = df_plot.resample(f"{bucket_days}D", on="log_date")
+    return resampled.mean(numeric_only=True).dropna(how="all").reset_index()
+
+
+def series_spec(
+    mark: str,
+    y_field: str,
+    y_title: str,
+    title: str | None = None,
+    color: str | None = None,
+) -> dict:
+    """按 log_date 画单个指标的 Vega-Lite spec（直接写 dict，省去 Altair 的构建开销）。"""
+    spec = {
+        "mark": {"type": mark, "point": True} if mark == "line" else {"type": mark},
+        "encoding": {
+            "x": {"field": "log_date", "type": "temporal"},
+            "y": {"field": y_field, "type": "quantitative", "title": y_title},
+        },
+    }
+    if color:
+        spec["mark"]["color"] = color
+    if title:
+        spec["title"] = title
+    return spec
+
+
+@st.cache_data(show_spinner=False)
+def trend_chart_spec(columns: tuple[str, ...], by_patient: bool = False) -> dict | None:
+    """
+    按记录中已有的列生成趋势图 spec：各指标纵向拼接（vconcat）成一张图，
+    前端只需编译、渲染一次。by_patient 为 True 时按 patient_code 区分颜色。
+    spec 只依赖列名、不含数据，切换患者 / 日期时也能直接命中缓存。
+    """
+    specs = []
+
+    # 体重
+    if "weight" in columns:
+        specs.append(series_spec("line", "weight", "体重 (kg)", "体重变化"))
+
+    # BMI
+    if "BMI" in columns:
+        specs.append(series_spec("line", "BMI", "BMI", "BMI 变化", color="#E76F51"))
+
+    # 总卡路里
+    if "total_kcal" in columns:
+        specs.append(
+            series_spec(
+                "line", "total_kcal", "每日总卡路里 (kcal)", "每日总卡路里", color="#2A9D8F"
+            )
+        )
+
+    # 睡眠 & 压力：单个患者时叠加在一张图上、用颜色区分指标；
+    # 多个患者时颜色用来区分患者，两条线会同色，所以拆成两张图
+    layers = []
+    if "sleep_hours" in columns:
+        layers.append(
+            series_spec(
+                "line",
+                "sleep_hours",
+                "睡眠时长 (h)",
+                "睡眠时长" if by_patient else None,
+                color="#264653",
+            )
+        )
+    if "stress_level" in columns:
+        layers.append(
+            series_spec(
+                "line",
+                "stress_level",
+                "压力 / 睡眠质量评分",
+                "压力 / 睡眠质量" if by_patient else None,
+                color="#E9C46A",
+            )
+        )
+    if by_patient:
+        specs.extend(layers)
+    elif layers:
+        specs.append(
+            {
+                "title": "睡眠 & 压力 / 睡眠质量",
+                "layer": layers,
+                "resolve": {"scale": {"y": "independent"}},
+            }
+        )
+
+    # 运动
+    if "sport_minutes" in columns:
+        specs.append(series_spec("bar", "sport_minutes", "运动时长 (min)", "运动时长"))
+
+    # 排便次数
+    if "bowel_count" in columns:
+        specs.append(
+            series_spec("bar", "bowel_count", "排便次数", "排便次数", color="#F4A261")
+        )
+
+    if not specs:
+        return None
+
+    if by_patient:
+        for spec in specs:
+            for view in spec.get("layer", [spec]):
+                view["encoding"]["color"] = {
+                    "field": "patient_code",
+                    "type": "nominal",
+                    "title": "患者",
+                }
+                if view["mark"]["type"] == "bar":
+                    # 同一天多个患者的柱子重叠显示而不是堆叠
+                    view["encoding"]["y"]["stack"] = None
+                    view["mark"]["opacity"] = 0.6
+
+    return {"vconcat": specs}
@@ -0,0 +1,39 @@
+-- 新建患者代码并在同一次往返中返回最新的患者列表（医生端『患者代码管理』页使用）。
+-- 患者代码仍由 doctor_common.py 的 generate_patient_code() 生成后传入。
+CREATE OR REPLACE FUNCTION insert_and_list_patients(
+    p_patient_code text,
+    p_remark text DEFAULT NULL,
+    p_limit integer DEFAULT 2000
+) RETURNS json
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r_new patients;
+BEGIN
+    INSERT INTO patients (patient_code, remark)
+    VALUES (p_patient_code, p_remark)
+    RETURNING * INTO r_new;
+
+    RETURN json_build_object(
+        'new', row_to_json(r_new),
+        'list', COALESCE(
+            (
+                SELECT json_agg(p ORDER BY p.created_at DESC)
+                FROM (
+                    SELECT *
+                    FROM patients
+                    ORDER BY created_at DESC
+                    LIMIT p_limit
+                ) p
+            ),
+            '[]'::json
+        )
+    );
+END;
+$$;
+
+-- 只给医生端（service_role）调用：函数默认对 PUBLIC 开放执行，Supabase 还会额外授权给
+-- anon / authenticated，患者端使用的 anon key 不应能读写患者列表。
+REVOKE EXECUTE ON FUNCTION insert_and_list_patients(text, text, integer)
+    FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION insert_and_list_patients(text, text, integer) TO service_role;
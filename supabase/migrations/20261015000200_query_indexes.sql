@@ -0,0 +1,10 @@
+-- 医生端 / 患者端常用查询的索引：
+--   patients: eq(patient_code).limit(1)、order(created_at desc).limit(N)
+-- daily_records 的 eq(patient_code) + log_date 范围查询直接使用
+-- upsert(on_conflict="patient_code,log_date") 依赖的 (patient_code, log_date) 唯一索引，
+-- 不再另建索引（btree 可反向扫描，DESC 也能用上）。
+CREATE UNIQUE INDEX IF NOT EXISTS patients_code_uniq
+    ON patients (patient_code);
+
+CREATE INDEX IF NOT EXISTS patients_created_desc
+    ON patients (created_at DESC);
@@ -0,0 +1,59 @@
+-- 每位患者按周汇总的指标，供医生端在较长日期范围内绘制趋势图。
+-- 列名与 daily_records 保持一致（log_date 为该周周一），前端图表 spec 可直接复用。
+--
+-- 物化视图不能启用 RLS，放在 public 下会被 anon / authenticated 通过
+-- /rest/v1/patient_weekly 读到所有患者的数据，所以放在 API 不暴露的 private schema，
+-- 医生端只通过下面的 RPC 读取。
+CREATE SCHEMA IF NOT EXISTS private;
+REVOKE ALL ON SCHEMA private FROM PUBLIC, anon, authenticated;
+GRANT USAGE ON SCHEMA private TO service_role;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS private.patient_weekly AS
+SELECT
+    patient_code,
+    date_trunc('week', log_date)::date AS log_date,
+    avg(weight) AS weight,
+    avg("BMI") AS "BMI",
+    avg(total_kcal) AS total_kcal,
+    avg(sleep_hours) AS sleep_hours,
+    avg(stress_level) AS stress_level,
+    avg(sport_minutes) AS sport_minutes,
+    avg(bowel_count) AS bowel_count
+FROM daily_records
+GROUP BY 1, 2;
+
+REVOKE ALL ON private.patient_weekly FROM PUBLIC, anon, authenticated;
+GRANT SELECT ON private.patient_weekly TO service_role;
+
+-- REFRESH ... CONCURRENTLY 需要唯一索引
+CREATE UNIQUE INDEX IF NOT EXISTS patient_weekly_code_week
+    ON private.patient_weekly (patient_code, log_date);
+
+CREATE OR REPLACE FUNCTION patient_weekly_summary(
+    p_code text,
+    p_start date,
+    p_end date
+) RETURNS SETOF private.patient_weekly
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT *
+    FROM private.patient_weekly
+    WHERE patient_code = p_code
+      AND log_date BETWEEN date_trunc('week', p_start)::date AND p_end
+    ORDER BY log_date;
+$$;
+
+-- 只给医生端（service_role）调用：函数默认对 PUBLIC 开放执行，Supabase 还会额外授权给
+-- anon / authenticated
+REVOKE EXECUTE ON FUNCTION patient_weekly_summary(text, date, date)
+    FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION patient_weekly_summary(text, date, date) TO service_role;
+
+-- 每晚刷新一次
+CREATE EXTENSION IF NOT EXISTS pg_cron;
+SELECT cron.schedule(
+    'refresh_patient_weekly',
+    '0 3 * * *',
+    'REFRESH MATERIALIZED VIEW CONCURRENTLY private.patient_weekly'
+);
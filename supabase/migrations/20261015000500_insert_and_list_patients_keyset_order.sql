@@ -0,0 +1,49 @@
+-- 与 doctor.py 的 keyset 分页保持一致：列表按 (created_at, id) 倒序返回。
+CREATE OR REPLACE FUNCTION insert_and_list_patients(
+    p_patient_code text,
+    p_remark text DEFAULT NULL,
+    p_limit integer DEFAULT 2000
+) RETURNS json
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r_new json;
+BEGIN
+    INSERT INTO patients (patient_code, remark)
+    VALUES (p_patient_code, p_remark)
+    RETURNING json_build_object(
+        'id', id,
+        'patient_code', patient_code,
+        'remark', remark,
+        'created_at', created_at
+    ) INTO r_new;
+
+    RETURN json_build_object(
+        'new', r_new,
+        'list', COALESCE(
+            (
+                SELECT json_agg(p ORDER BY p.created_at DESC, p.id DESC)
+                FROM (
+                    SELECT id, patient_code, remark, created_at
+                    FROM patients
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT p_limit
+                ) p
+            ),
+            '[]'::json
+        )
+    );
+END;
+$$;
+
+-- 只给医生端（service_role）调用：函数默认对 PUBLIC 开放执行，Supabase 还会额外授权给
+-- anon / authenticated，患者端使用的 anon key 不应能读写患者列表。
+REVOKE EXECUTE ON FUNCTION insert_and_list_patients(text, text, integer)
+    FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION insert_and_list_patients(text, text, integer) TO service_role;
+
+CREATE INDEX IF NOT EXISTS patients_created_id_desc
+    ON patients (created_at DESC, id DESC);
+
+-- (created_at DESC, id DESC) 已覆盖只按 created_at 排序的查询
+DROP INDEX IF EXISTS patients_created_desc;
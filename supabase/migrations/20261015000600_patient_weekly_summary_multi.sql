@@ -0,0 +1,22 @@
+-- 医生端可同时查看多个患者：patient_weekly_summary 改为接收患者代码数组。
+DROP FUNCTION IF EXISTS patient_weekly_summary(text, date, date);
+
+CREATE OR REPLACE FUNCTION patient_weekly_summary(
+    p_codes text[],
+    p_start date,
+    p_end date
+) RETURNS SETOF private.patient_weekly
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT *
+    FROM private.patient_weekly
+    WHERE patient_code = ANY (p_codes)
+      AND log_date BETWEEN date_trunc('week', p_start)::date AND p_end
+    ORDER BY log_date, patient_code;
+$$;
+
+-- 与旧版本相同，只给医生端（service_role）调用
+REVOKE EXECUTE ON FUNCTION patient_weekly_summary(text[], date, date)
+    FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION patient_weekly_summary(text[], date, date) TO service_role;
@@ -0,0 +1,8 @@
+-- 医生端按患者代码 / 备注模糊搜索（ilike '%...%'）使用的 trigram 索引。
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS patients_patient_code_trgm
+    ON patients USING gin (patient_code gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS patients_remark_trgm
+    ON patients USING gin (remark gin_trgm_ops);